@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import os
 import tkinter as tk
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date
 from tkinter import messagebox, ttk
+from typing import Any, Callable
 
 from db import Database
-import matplotlib
-matplotlib.use('Agg') # Evita que Matplotlib intente abrir una ventana
+
+# Rows inserted per event-loop tick during large Treeview loads.
+_INSERT_CHUNK = 100
 
 
 class CareerPlannerApp(ttk.Frame):
@@ -15,6 +18,20 @@ class CareerPlannerApp(ttk.Frame):
         super().__init__(master)
         self.db = db
         self.scenario_id: int | None = None
+        self._chart_children: dict[int | None, list[int]] = {}
+        self._positions_by_id: dict[int, "Position"] = {}
+        self._positions_order: list["Position"] = []
+        self._employees_by_id: dict[int, "Employee"] = {}
+        self._employees_order: list["Employee"] = []
+        self._position_rows: dict[int, tuple] | None = None
+        self._employee_rows: dict[int, tuple] | None = None
+        self._assignment_rows: dict[int, tuple] | None = None
+        self._combo_cache: dict[ttk.Combobox, tuple[str, ...]] = {}
+        self._tree_generation: dict[ttk.Treeview, int] = {}
+        self._tree_loading: set[ttk.Treeview] = set()
+        # Single worker so DB calls stay off the Tk main thread but writes
+        # remain serialized on one connection.
+        self._executor = ThreadPoolExecutor(max_workers=1)
 
         self._build_ui()
         self._refresh_scenarios()
@@ -32,6 +49,8 @@ class CareerPlannerApp(ttk.Frame):
         ttk.Button(header, text="Seed 5 Years (Quarterly)", command=self._seed_quarters).pack(
             side=tk.RIGHT
         )
+        self.status = tk.StringVar()
+        ttk.Label(header, textvariable=self.status).pack(side=tk.RIGHT, padx=8)
 
         self.scenario_tabs = ttk.Notebook(self)
         self.scenario_tabs.pack(fill=tk.X, padx=12, pady=4)
@@ -55,12 +74,50 @@ class CareerPlannerApp(ttk.Frame):
         self._build_employees_tab()
         self._build_assignments_tab()
 
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _run_db(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+    ) -> None:
+        """Run a Database call on the worker thread and deliver its result to
+        *on_done* back on the Tk main thread."""
+        future = self._executor.submit(fn, *args)
+        self._poll_db_future(future, on_done, on_error)
+
+    def _poll_db_future(
+        self,
+        future: Future,
+        on_done: Callable[[Any], None] | None,
+        on_error: Callable[[Exception], None] | None,
+    ) -> None:
+        if not future.done():
+            self.after(10, self._poll_db_future, future, on_done, on_error)
+            return
+        try:
+            result = future.result()
+        except Exception as exc:  # noqa: BLE001
+            if on_error is None:
+                raise
+            on_error(exc)
+            return
+        if on_done is not None:
+            on_done(result)
+
     def _seed_quarters(self) -> None:
-        self.db.seed_quarter_scenarios(5)
-        self._refresh_scenarios()
+        self._run_db(
+            self.db.seed_quarter_scenarios, 5,
+            on_done=lambda _result: self._refresh_scenarios(),
+        )
 
     def _refresh_scenarios(self) -> None:
-        scenarios = self.db.list_scenarios()
+        self._run_db(self.db.list_scenarios, on_done=self._apply_scenarios)
+
+    def _apply_scenarios(self, scenarios: list) -> None:
         self.scenarios = scenarios
         self.scenario_tabs_tabs = {}
         for tab in self.scenario_tabs.tabs():
@@ -81,8 +138,8 @@ class CareerPlannerApp(ttk.Frame):
         self._refresh_all()
 
     def _refresh_all(self) -> None:
+        # _apply_positions re-renders the chart once the fetch lands.
         self._refresh_positions()
-        self._refresh_chart()
         self._refresh_employees()
         self._refresh_assignments()
 
@@ -113,8 +170,13 @@ class CareerPlannerApp(ttk.Frame):
         )
 
         self.position_tree = ttk.Treeview(
-            self.position_tab, columns=("dept", "parent"), show="headings", height=12
+            self.position_tab,
+            columns=("dept", "parent"),
+            displaycolumns=("dept", "parent"),
+            show=("tree", "headings"),
+            height=12,
         )
+        self.position_tree.heading("#0", text="Title")
         self.position_tree.heading("dept", text="Department")
         self.position_tree.heading("parent", text="Reports To")
         self.position_tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
@@ -135,6 +197,8 @@ class CareerPlannerApp(ttk.Frame):
 
         self.chart_tree = ttk.Treeview(self.chart_tab, show="tree", height=16)
         self.chart_tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
+        self.chart_tree.bind("<<TreeviewOpen>>", self._on_chart_open)
+        self.chart_tree.bind("<<TreeviewClose>>", self._on_chart_close)
 
     def _build_employees_tab(self) -> None:
         form = ttk.LabelFrame(self.employee_tab, text="Add Employee")
@@ -156,8 +220,13 @@ class CareerPlannerApp(ttk.Frame):
         )
 
         self.employee_tree = ttk.Treeview(
-            self.employee_tab, columns=("code",), show="headings", height=12
+            self.employee_tab,
+            columns=("code",),
+            displaycolumns=("code",),
+            show=("tree", "headings"),
+            height=12,
         )
+        self.employee_tree.heading("#0", text="Employee")
         self.employee_tree.heading("code", text="Employee Code")
         self.employee_tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
 
@@ -215,12 +284,14 @@ class CareerPlannerApp(ttk.Frame):
         if not title or not department:
             messagebox.showwarning("Missing data", "Title and department are required.")
             return
-        parent_id = self._combo_value_to_id(self.position_parent.get(), self._positions_cache)
-        self.db.add_position(self.scenario_id, title, department, parent_id)
+        parent_id = self._combo_selected_id(self.position_parent_combo, self._positions_order)
         self.position_title.set("")
         self.position_department.set("")
         self.position_parent.set("")
-        self._refresh_positions()
+        self._run_db(
+            self.db.add_position, self.scenario_id, title, department, parent_id,
+            on_done=lambda _result: self._refresh_positions(),
+        )
 
     def _add_employee(self) -> None:
         code = self.employee_code.get().strip()
@@ -228,167 +299,286 @@ class CareerPlannerApp(ttk.Frame):
         if not code or not name:
             messagebox.showwarning("Missing data", "Employee code and full name are required.")
             return
-        try:
-            self.db.add_employee(code, name)
-        except Exception as exc:  # noqa: BLE001
-            messagebox.showerror("Error", f"Unable to add employee: {exc}")
-            return
-        self.employee_code.set("")
-        self.employee_name.set("")
-        self._refresh_employees()
+        def on_done(_result: Any) -> None:
+            self.employee_code.set("")
+            self.employee_name.set("")
+            self._refresh_employees()
+
+        self._run_db(
+            self.db.add_employee, code, name,
+            on_done=on_done,
+            on_error=lambda exc: messagebox.showerror(
+                "Error", f"Unable to add employee: {exc}"
+            ),
+        )
 
     def _move_employee(self) -> None:
         if self.scenario_id is None:
             messagebox.showwarning("Missing scenario", "Please select a scenario first.")
             return
-        employee_id = self._combo_value_to_id(
-            self.assignment_employee.get(), self._employees_cache
+        employee_id = self._combo_selected_id(
+            self.assignment_employee_combo, self._employees_order
         )
-        position_id = self._combo_value_to_id(
-            self.assignment_position.get(), self._positions_cache
+        position_id = self._combo_selected_id(
+            self.assignment_position_combo, self._positions_order
         )
         start_date = self.assignment_start.get().strip()
         if not employee_id or not position_id or not start_date:
             messagebox.showwarning("Missing data", "Employee, position, and start date are required.")
             return
-        self.db.move_employee(employee_id, position_id, start_date)
-        self._refresh_assignments()
+        self._run_db(
+            self.db.move_employee, employee_id, position_id, start_date,
+            on_done=lambda _result: self._refresh_assignments(),
+        )
 
     def _delete_position(self) -> None:
         selected = self.position_tree.selection()
         if not selected:
             return
         position_id = int(selected[0])
-        self.db.delete_position(position_id)
-        self._refresh_positions()
+        self._run_db(
+            self.db.delete_position, position_id,
+            on_done=lambda _result: self._refresh_positions(),
+        )
 
     def _delete_employee(self) -> None:
         selected = self.employee_tree.selection()
         if not selected:
             return
         employee_id = int(selected[0])
-        self.db.delete_employee(employee_id)
-        self._refresh_employees()
+        self._run_db(
+            self.db.delete_employee, employee_id,
+            on_done=lambda _result: self._refresh_employees(),
+        )
 
     def _delete_assignment(self) -> None:
         selected = self.assignment_tree.selection()
         if not selected:
             return
         assignment_id = int(selected[0])
-        self.db.delete_assignment(assignment_id)
-        self._refresh_assignments()
+        self._run_db(
+            self.db.delete_assignment, assignment_id,
+            on_done=lambda _result: self._refresh_assignments(),
+        )
+
+    def _sync_tree(
+        self,
+        tree: ttk.Treeview,
+        old_rows: dict[int, tuple] | None,
+        new_rows: dict[int, tuple],
+        show: tuple[str, ...],
+    ) -> None:
+        """Bring *tree* in line with ``new_rows`` (id -> (text, values)), issuing
+        add/delete/update calls only for the rows that actually changed. Loads
+        larger than _INSERT_CHUNK are spread across event-loop ticks."""
+        old_rows = old_rows or {}
+        generation = self._tree_generation.get(tree, 0) + 1
+        self._tree_generation[tree] = generation
+        if tree in self._tree_loading:
+            # A previous chunked load was cancelled mid-way, so the cached rows
+            # no longer match the widget; start over from an empty tree.
+            self._tree_loading.discard(tree)
+            tree.delete(*tree.get_children())
+            old_rows = {}
+            if not self._tree_loading:
+                self.status.set("")
+        to_delete = [row_id for row_id in old_rows if row_id not in new_rows]
+        to_insert = []
+        for row_id, (text, values) in new_rows.items():
+            old = old_rows.get(row_id)
+            if old is None:
+                to_insert.append((row_id, text, values))
+            elif old != (text, values):
+                tree.item(str(row_id), text=text, values=values)
+        # Hide the widget body during bulk rebuilds so Tk doesn't redraw per row.
+        bulk = len(to_delete) + len(to_insert) > _INSERT_CHUNK
+        if bulk:
+            tree["show"] = ()
+        for row_id in to_delete:
+            tree.delete(str(row_id))
+        if len(to_insert) <= _INSERT_CHUNK:
+            for row_id, text, values in to_insert:
+                tree.insert("", tk.END, iid=str(row_id), text=text, values=values)
+            self._finish_tree_sync(tree, new_rows, show, bool(to_insert))
+            return
+        self._tree_loading.add(tree)
+        self.status.set(f"Loading {len(to_insert)} rows...")
+        self._insert_chunk(tree, to_insert, 0, new_rows, show, generation)
+
+    def _insert_chunk(
+        self,
+        tree: ttk.Treeview,
+        pending: list[tuple],
+        start: int,
+        new_rows: dict[int, tuple],
+        show: tuple[str, ...],
+        generation: int,
+    ) -> None:
+        if generation != self._tree_generation.get(tree):
+            return
+        for row_id, text, values in pending[start : start + _INSERT_CHUNK]:
+            tree.insert("", tk.END, iid=str(row_id), text=text, values=values)
+        start += _INSERT_CHUNK
+        if start < len(pending):
+            self.after(0, self._insert_chunk, tree, pending, start, new_rows, show, generation)
+            return
+        self._tree_loading.discard(tree)
+        self._finish_tree_sync(tree, new_rows, show, True)
+
+    def _finish_tree_sync(
+        self,
+        tree: ttk.Treeview,
+        new_rows: dict[int, tuple],
+        show: tuple[str, ...],
+        had_inserts: bool,
+    ) -> None:
+        desired = [str(row_id) for row_id in new_rows]
+        if had_inserts and list(tree.get_children("")) != desired:
+            for index, iid in enumerate(desired):
+                tree.move(iid, "", index)
+        # Restore unconditionally: the previous sync may have been a chunked
+        # load that was cancelled after freezing this tree.
+        tree["show"] = show
+        if not self._tree_loading:
+            self.status.set("")
+
+    def _set_combo_values(self, combo: ttk.Combobox, values: tuple[str, ...]) -> None:
+        if self._combo_cache.get(combo) == values:
+            return
+        self._combo_cache[combo] = values
+        combo["values"] = values
 
     def _refresh_positions(self) -> None:
         if self.scenario_id is None:
             return
-        self.position_tree.delete(*self.position_tree.get_children())
-        positions = self.db.list_positions(self.scenario_id)
-        self._positions_cache = {position.title: position.id for position in positions}
-        for position in positions:
-            parent_name = next(
-                (p.title for p in positions if p.id == position.parent_position_id),
-                "",
-            )
-            self.position_tree.insert(
-                "",
-                tk.END,
-                iid=str(position.id),
-                values=(position.department, parent_name),
-                text=position.title,
+        scenario_id = self.scenario_id
+        self._run_db(
+            self.db.list_positions, scenario_id,
+            on_done=lambda positions: self._apply_positions(scenario_id, positions),
+        )
+
+    def _apply_positions(self, scenario_id: int, positions: list) -> None:
+        if scenario_id != self.scenario_id:
+            return
+        self._positions_by_id = {position.id: position for position in positions}
+        self._positions_order = positions
+        title_by_id = {position.id: position.title for position in positions}
+        new_rows = {
+            position.id: (
+                position.title,
+                (position.department, title_by_id.get(position.parent_position_id, "")),
             )
-        self.position_tree.configure(displaycolumns=("dept", "parent"))
-        self.position_tree["show"] = ("tree", "headings")
-        self.position_tree.heading("#0", text="Title")
-        self.position_parent_combo["values"] = [position.title for position in positions]
-        self.assignment_position_combo["values"] = [position.title for position in positions]
-        self.chart_root_combo["values"] = ["(Full Org Chart)"] + [
-            position.title for position in positions
-        ]
+            for position in positions
+        }
+        if new_rows == self._position_rows:
+            return
+        self._sync_tree(self.position_tree, self._position_rows, new_rows, ("tree", "headings"))
+        self._position_rows = new_rows
+        titles = tuple(position.title for position in positions)
+        self._set_combo_values(self.position_parent_combo, titles)
+        self._set_combo_values(self.assignment_position_combo, titles)
+        self._set_combo_values(self.chart_root_combo, ("(Full Org Chart)",) + titles)
         if not self.chart_root.get():
             self.chart_root.set("(Full Org Chart)")
+        children: dict[int | None, list[int]] = {}
+        for position in positions:
+            # Positions arrive sorted by (department, title), so each child
+            # list is already in display order.
+            children.setdefault(position.parent_position_id, []).append(position.id)
+        self._chart_children = children
+        self._render_chart()
 
     def _refresh_employees(self) -> None:
-        self.employee_tree.delete(*self.employee_tree.get_children())
-        employees = self.db.list_employees()
-        self._employees_cache = {employee.full_name: employee.id for employee in employees}
-        for employee in employees:
-            self.employee_tree.insert(
-                "",
-                tk.END,
-                iid=str(employee.id),
-                values=(employee.employee_code,),
-                text=employee.full_name,
-            )
-        self.employee_tree.configure(displaycolumns=("code",))
-        self.employee_tree["show"] = ("tree", "headings")
-        self.employee_tree.heading("#0", text="Employee")
-        self.assignment_employee_combo["values"] = [employee.full_name for employee in employees]
+        self._run_db(self.db.list_employees, on_done=self._apply_employees)
+
+    def _apply_employees(self, employees: list) -> None:
+        self._employees_by_id = {employee.id: employee for employee in employees}
+        self._employees_order = employees
+        new_rows = {
+            employee.id: (employee.full_name, (employee.employee_code,))
+            for employee in employees
+        }
+        if new_rows == self._employee_rows:
+            return
+        self._sync_tree(self.employee_tree, self._employee_rows, new_rows, ("tree", "headings"))
+        self._employee_rows = new_rows
+        self._set_combo_values(
+            self.assignment_employee_combo,
+            tuple(employee.full_name for employee in employees),
+        )
 
     def _refresh_assignments(self) -> None:
         if self.scenario_id is None:
             return
-        self.assignment_tree.delete(*self.assignment_tree.get_children())
-        assignments = self.db.list_assignments(self.scenario_id)
-        employees = {employee.id: employee.full_name for employee in self.db.list_employees()}
-        positions = {position.id: position.title for position in self.db.list_positions(self.scenario_id)}
-        for assignment in assignments:
-            self.assignment_tree.insert(
-                "",
-                tk.END,
-                iid=str(assignment.id),
-                values=(
-                    employees.get(assignment.employee_id, ""),
-                    positions.get(assignment.position_id, ""),
-                    assignment.start_date,
-                    assignment.end_date or "",
-                ),
-            )
+        scenario_id = self.scenario_id
+        self._run_db(
+            self.db.list_assignments_denorm, scenario_id,
+            on_done=lambda rows: self._apply_assignments(scenario_id, rows),
+        )
 
-    def _refresh_chart(self) -> None:
-        if self.scenario_id is None:
+    def _apply_assignments(self, scenario_id: int, rows: list) -> None:
+        if scenario_id != self.scenario_id:
             return
-        self.chart_tree.delete(*self.chart_tree.get_children())
-        positions = self.db.list_positions(self.scenario_id)
-        if not positions:
+        new_rows = {
+            assignment_id: ("", (employee_name, position_title, start_date, end_date or ""))
+            for assignment_id, employee_name, position_title, start_date, end_date in rows
+        }
+        if new_rows == self._assignment_rows:
             return
-        position_by_id = {position.id: position for position in positions}
-        children: dict[int | None, list[int]] = {}
-        for position in positions:
-            children.setdefault(position.parent_position_id, []).append(position.id)
-        for child_ids in children.values():
-            child_ids.sort(
-                key=lambda pid: (position_by_id[pid].department, position_by_id[pid].title)
-            )
+        self._sync_tree(self.assignment_tree, self._assignment_rows, new_rows, ("headings",))
+        self._assignment_rows = new_rows
 
-        root_selection = self.chart_root.get().strip()
-        if root_selection and root_selection != "(Full Org Chart)":
-            root_id = self._positions_cache.get(root_selection)
-            if root_id is None:
+    def _refresh_chart(self) -> None:
+        self._render_chart()
+
+    def _render_chart(self) -> None:
+        self.chart_tree.delete(*self.chart_tree.get_children())
+        if not self._positions_by_id:
+            return
+        # Index 0 in the root combo is the "(Full Org Chart)" entry.
+        root_index = self.chart_root_combo.current()
+        if root_index > 0:
+            if root_index - 1 >= len(self._positions_order):
                 return
-            self._insert_chart_node(root_id, "", position_by_id, children)
+            self._insert_chart_nodes([self._positions_order[root_index - 1].id], "")
         else:
-            for root_id in children.get(None, []):
-                self._insert_chart_node(root_id, "", position_by_id, children)
+            self._insert_chart_nodes(self._chart_children.get(None, []), "")
+
+    def _insert_chart_nodes(self, node_ids: list[int], parent_item: str) -> None:
+        for node_id in node_ids:
+            position = self._positions_by_id[node_id]
+            label = f"{position.title} ({position.department})"
+            item = self.chart_tree.insert(
+                parent_item, tk.END, iid=str(node_id), text=label
+            )
+            self._insert_chart_node_placeholder(item)
 
-    def _insert_chart_node(
-        self,
-        node_id: int,
-        parent_item: str,
-        position_by_id: dict[int, "Position"],
-        children: dict[int | None, list[int]],
-    ) -> None:
-        position = position_by_id[node_id]
-        label = f"{position.title} ({position.department})"
-        item = self.chart_tree.insert(parent_item, tk.END, text=label)
-        for child_id in children.get(node_id, []):
-            self._insert_chart_node(child_id, item, position_by_id, children)
+    def _on_chart_open(self, _event: tk.Event) -> None:
+        item = self.chart_tree.focus()
+        child_items = self.chart_tree.get_children(item)
+        if not child_items or not child_items[0].startswith("dummy-"):
+            return
+        self.chart_tree.delete(child_items[0])
+        self._insert_chart_nodes(self._chart_children.get(int(item), []), item)
+
+    def _on_chart_close(self, _event: tk.Event) -> None:
+        item = self.chart_tree.focus()
+        if not item or item.startswith("dummy-"):
+            return
+        self.chart_tree.delete(*self.chart_tree.get_children(item))
+        self._insert_chart_node_placeholder(item)
+
+    def _insert_chart_node_placeholder(self, item: str) -> None:
+        # Placeholder child so the expander arrow shows; replaced on first open.
+        if self._chart_children.get(int(item)):
+            self.chart_tree.insert(item, tk.END, iid=f"dummy-{item}")
 
     @staticmethod
-    def _combo_value_to_id(value: str, mapping: dict[str, int]) -> int | None:
-        value = value.strip()
-        if not value:
+    def _combo_selected_id(combo: ttk.Combobox, order: list) -> int | None:
+        index = combo.current()
+        if index < 0 or index >= len(order):
             return None
-        return mapping.get(value)
+        return order[index].id
 
 
 def main() -> None:
@@ -410,8 +600,18 @@ def main() -> None:
 
     style = ttk.Style(root)
     style.theme_use("clam")
+    # Pin a uniform row height so the Treeviews lay out O(visible) rows
+    # instead of measuring every row.
+    style.configure("Treeview", rowheight=20)
 
     app = CareerPlannerApp(root, db)
+
+    def on_close() -> None:
+        app.shutdown()
+        db.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
     app.mainloop()
 
 
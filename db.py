@@ -2,15 +2,84 @@ from __future__ import annotations
 
 import os
 import sqlite3
-from dataclasses import dataclass
 from datetime import date
-from typing import Iterable
+from typing import Iterable, Iterator, NamedTuple
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "career_planning.db")
 
+# (quarter, start_month, end_month, end_year_offset) — identical for every year.
+_QUARTER_BOUNDS = ((1, 1, 4, 0), (2, 4, 7, 0), (3, 7, 10, 0), (4, 10, 1, 1))
 
-@dataclass(frozen=True)
-class Scenario:
+_SQL_SEED_SCENARIOS = """
+    INSERT OR IGNORE INTO scenarios (name, year, quarter, start_date, end_date)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+_SQL_LIST_SCENARIOS = (
+    "SELECT id, name, year, quarter, start_date, end_date FROM scenarios ORDER BY year, quarter"
+)
+
+_SQL_LIST_POSITIONS = """
+    SELECT id, scenario_id, title, department, parent_position_id
+    FROM positions
+    WHERE scenario_id = ?
+    ORDER BY department, title
+"""
+
+_SQL_LIST_EMPLOYEES = "SELECT id, employee_code, full_name FROM employees ORDER BY full_name"
+
+_SQL_LIST_ASSIGNMENTS = """
+    SELECT a.id, a.employee_id, a.position_id, a.start_date, a.end_date
+    FROM assignments a
+    JOIN positions p ON a.position_id = p.id
+    WHERE p.scenario_id = ?
+    ORDER BY a.start_date DESC
+"""
+
+_SQL_LIST_ASSIGNMENTS_DENORM = """
+    SELECT a.id, e.full_name, p.title, a.start_date, a.end_date
+    FROM assignments a
+    JOIN positions p ON p.id = a.position_id
+    JOIN employees e ON e.id = a.employee_id
+    WHERE p.scenario_id = ?
+    ORDER BY a.start_date DESC
+"""
+
+_SQL_ADD_POSITION = """
+    INSERT INTO positions (scenario_id, title, department, parent_position_id)
+    VALUES (?, ?, ?, ?)
+"""
+
+_SQL_ADD_EMPLOYEE = "INSERT INTO employees (employee_code, full_name) VALUES (?, ?)"
+
+_SQL_ADD_ASSIGNMENT = """
+    INSERT INTO assignments (employee_id, position_id, start_date, end_date)
+    VALUES (?, ?, ?, ?)
+"""
+
+_SQL_CLOSE_OPEN_ASSIGNMENT = """
+    UPDATE assignments
+    SET end_date = ?
+    WHERE employee_id = ? AND end_date IS NULL
+"""
+
+_SQL_OPEN_ASSIGNMENT = """
+    INSERT INTO assignments (employee_id, position_id, start_date, end_date)
+    VALUES (?, ?, ?, NULL)
+"""
+
+_SQL_DELETE_POSITION = "DELETE FROM positions WHERE id = ?"
+
+_SQL_DELETE_EMPLOYEE = "DELETE FROM employees WHERE id = ?"
+
+_SQL_DELETE_ASSIGNMENT = "DELETE FROM assignments WHERE id = ?"
+
+_SQL_BULK_POSITIONS = "SELECT id, title FROM positions WHERE scenario_id = ? ORDER BY title"
+
+_SQL_BULK_EMPLOYEES = "SELECT id, full_name FROM employees ORDER BY full_name"
+
+
+class Scenario(NamedTuple):
     id: int
     name: str
     year: int
@@ -19,8 +88,7 @@ class Scenario:
     end_date: str
 
 
-@dataclass(frozen=True)
-class Position:
+class Position(NamedTuple):
     id: int
     scenario_id: int
     title: str
@@ -28,15 +96,13 @@ class Position:
     parent_position_id: int | None
 
 
-@dataclass(frozen=True)
-class Employee:
+class Employee(NamedTuple):
     id: int
     employee_code: str
     full_name: str
 
 
-@dataclass(frozen=True)
-class Assignment:
+class Assignment(NamedTuple):
     id: int
     employee_id: int
     position_id: int
@@ -48,202 +114,221 @@ class Database:
     def __init__(self, path: str = DB_PATH) -> None:
         self.path = path
         os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        self._cache: dict[tuple, list] = {}
         self._connect_and_init()
 
     def _connect_and_init(self) -> None:
-        with self._connect() as conn:
-            conn.executescript(
-                """
-                PRAGMA foreign_keys = ON;
-
-                CREATE TABLE IF NOT EXISTS scenarios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    year INTEGER NOT NULL,
-                    quarter INTEGER NOT NULL,
-                    start_date TEXT NOT NULL,
-                    end_date TEXT NOT NULL,
-                    UNIQUE(year, quarter)
-                );
-
-                CREATE TABLE IF NOT EXISTS positions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    scenario_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    department TEXT NOT NULL,
-                    parent_position_id INTEGER,
-                    FOREIGN KEY (scenario_id) REFERENCES scenarios(id) ON DELETE CASCADE,
-                    FOREIGN KEY (parent_position_id) REFERENCES positions(id) ON DELETE SET NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS employees (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    employee_code TEXT NOT NULL UNIQUE,
-                    full_name TEXT NOT NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS assignments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    employee_id INTEGER NOT NULL,
-                    position_id INTEGER NOT NULL,
-                    start_date TEXT NOT NULL,
-                    end_date TEXT,
-                    FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
-                    FOREIGN KEY (position_id) REFERENCES positions(id) ON DELETE CASCADE
-                );
-                """
-            )
+        conn = self._conn
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -20000")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scenarios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                quarter INTEGER NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                UNIQUE(year, quarter)
+            );
+
+            CREATE TABLE IF NOT EXISTS positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scenario_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                department TEXT NOT NULL,
+                parent_position_id INTEGER,
+                FOREIGN KEY (scenario_id) REFERENCES scenarios(id) ON DELETE CASCADE,
+                FOREIGN KEY (parent_position_id) REFERENCES positions(id) ON DELETE SET NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS employees (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_code TEXT NOT NULL UNIQUE,
+                full_name TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS assignments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                position_id INTEGER NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT,
+                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
+                FOREIGN KEY (position_id) REFERENCES positions(id) ON DELETE CASCADE
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_positions_scenario
+                ON positions(scenario_id, department, title);
+            CREATE INDEX IF NOT EXISTS idx_assignments_position
+                ON assignments(position_id);
+            CREATE INDEX IF NOT EXISTS idx_assignments_employee_open
+                ON assignments(employee_id) WHERE end_date IS NULL;
+            """
+        )
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self._conn
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _invalidate(self, *names: str) -> None:
+        for key in [key for key in self._cache if key[0] in names]:
+            del self._cache[key]
 
     def seed_quarter_scenarios(self, years: int = 5) -> None:
         current_year = date.today().year
+        existing = self._conn.execute(
+            "SELECT COUNT(*) FROM scenarios WHERE year BETWEEN ? AND ?",
+            (current_year, current_year + years - 1),
+        ).fetchone()[0]
+        if existing == 4 * years:
+            return
         scenarios = []
         for year in range(current_year, current_year + years):
-            for quarter in range(1, 5):
-                start_month = (quarter - 1) * 3 + 1
-                start = date(year, start_month, 1)
-                if start_month + 3 > 12:
-                    end = date(year + 1, 1, 1)
-                else:
-                    end = date(year, start_month + 3, 1)
-                end_date = end.replace(day=1)
+            for quarter, start_month, end_month, end_year_offset in _QUARTER_BOUNDS:
                 scenarios.append(
                     (
                         f"FY{year} Q{quarter}",
                         year,
                         quarter,
-                        start.isoformat(),
-                        end_date.isoformat(),
+                        f"{year:04d}-{start_month:02d}-01",
+                        f"{year + end_year_offset:04d}-{end_month:02d}-01",
                     )
                 )
-        with self._connect() as conn:
-            conn.executemany(
-                """
-                INSERT OR IGNORE INTO scenarios (name, year, quarter, start_date, end_date)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                scenarios,
-            )
+        with self._conn:
+            self._conn.executemany(_SQL_SEED_SCENARIOS, scenarios)
+        self._invalidate("list_scenarios")
 
     def list_scenarios(self) -> list[Scenario]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT id, name, year, quarter, start_date, end_date FROM scenarios ORDER BY year, quarter"
-            ).fetchall()
-        return [Scenario(**row) for row in rows]
+        key = ("list_scenarios",)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        cur = self._conn.execute(_SQL_LIST_SCENARIOS)
+        result = self._cache[key] = [Scenario(*row) for row in cur]
+        return result
 
     def list_positions(self, scenario_id: int) -> list[Position]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                """
-                SELECT id, scenario_id, title, department, parent_position_id
-                FROM positions
-                WHERE scenario_id = ?
-                ORDER BY department, title
-                """,
-                (scenario_id,),
-            ).fetchall()
-        return [Position(**row) for row in rows]
+        key = ("list_positions", scenario_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        cur = self._conn.execute(_SQL_LIST_POSITIONS, (scenario_id,))
+        result = self._cache[key] = [Position(*row) for row in cur]
+        return result
+
+    def list_positions_iter(self, scenario_id: int) -> Iterator[Position]:
+        """Yield positions one row at a time, bypassing the result cache."""
+        for row in self._conn.execute(_SQL_LIST_POSITIONS, (scenario_id,)):
+            yield Position(*row)
 
     def list_employees(self) -> list[Employee]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT id, employee_code, full_name FROM employees ORDER BY full_name"
-            ).fetchall()
-        return [Employee(**row) for row in rows]
+        key = ("list_employees",)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        cur = self._conn.execute(_SQL_LIST_EMPLOYEES)
+        result = self._cache[key] = [Employee(*row) for row in cur]
+        return result
 
     def list_assignments(self, scenario_id: int) -> list[Assignment]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                """
-                SELECT a.id, a.employee_id, a.position_id, a.start_date, a.end_date
-                FROM assignments a
-                JOIN positions p ON a.position_id = p.id
-                WHERE p.scenario_id = ?
-                ORDER BY a.start_date DESC
-                """,
-                (scenario_id,),
-            ).fetchall()
-        return [Assignment(**row) for row in rows]
+        key = ("list_assignments", scenario_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        cur = self._conn.execute(_SQL_LIST_ASSIGNMENTS, (scenario_id,))
+        result = self._cache[key] = [Assignment(*row) for row in cur]
+        return result
+
+    def list_assignments_denorm(
+        self, scenario_id: int
+    ) -> list[tuple[int, str, str, str, str | None]]:
+        key = ("list_assignments_denorm", scenario_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        rows = self._conn.execute(_SQL_LIST_ASSIGNMENTS_DENORM, (scenario_id,)).fetchall()
+        result = self._cache[key] = rows
+        return result
 
     def add_position(
         self, scenario_id: int, title: str, department: str, parent_position_id: int | None
     ) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO positions (scenario_id, title, department, parent_position_id)
-                VALUES (?, ?, ?, ?)
-                """,
-                (scenario_id, title, department, parent_position_id),
+        with self._conn:
+            self._conn.execute(
+                _SQL_ADD_POSITION, (scenario_id, title, department, parent_position_id)
             )
+        self._cache.pop(("list_positions", scenario_id), None)
 
     def add_employee(self, employee_code: str, full_name: str) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                "INSERT INTO employees (employee_code, full_name) VALUES (?, ?)",
-                (employee_code, full_name),
-            )
+        with self._conn:
+            self._conn.execute(_SQL_ADD_EMPLOYEE, (employee_code, full_name))
+        self._invalidate("list_employees")
 
     def add_assignment(
         self, employee_id: int, position_id: int, start_date: str, end_date: str | None
     ) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO assignments (employee_id, position_id, start_date, end_date)
-                VALUES (?, ?, ?, ?)
-                """,
-                (employee_id, position_id, start_date, end_date),
+        with self._conn:
+            self._conn.execute(
+                _SQL_ADD_ASSIGNMENT, (employee_id, position_id, start_date, end_date)
             )
+        self._invalidate("list_assignments", "list_assignments_denorm")
 
     def move_employee(
         self, employee_id: int, new_position_id: int, start_date: str
     ) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                UPDATE assignments
-                SET end_date = ?
-                WHERE employee_id = ? AND end_date IS NULL
-                """,
-                (start_date, employee_id),
-            )
-            conn.execute(
-                """
-                INSERT INTO assignments (employee_id, position_id, start_date, end_date)
-                VALUES (?, ?, ?, NULL)
-                """,
-                (employee_id, new_position_id, start_date),
+        self.bulk_move_employees([(employee_id, new_position_id, start_date)])
+
+    def bulk_move_employees(self, moves: list[tuple[int, int, str]]) -> None:
+        """Apply (employee_id, new_position_id, start_date) moves atomically.
+
+        Closes each employee's open assignment and opens the new one inside a
+        single explicit transaction, so a batch of moves costs one commit.
+        """
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                _SQL_CLOSE_OPEN_ASSIGNMENT,
+                [(start_date, employee_id) for employee_id, _, start_date in moves],
             )
+            conn.executemany(_SQL_OPEN_ASSIGNMENT, moves)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._invalidate("list_assignments", "list_assignments_denorm")
 
     def delete_position(self, position_id: int) -> None:
-        with self._connect() as conn:
-            conn.execute("DELETE FROM positions WHERE id = ?", (position_id,))
+        with self._conn:
+            self._conn.execute(_SQL_DELETE_POSITION, (position_id,))
+        self._invalidate("list_positions", "list_assignments", "list_assignments_denorm")
 
     def delete_employee(self, employee_id: int) -> None:
-        with self._connect() as conn:
-            conn.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
+        with self._conn:
+            self._conn.execute(_SQL_DELETE_EMPLOYEE, (employee_id,))
+        self._invalidate("list_employees", "list_assignments", "list_assignments_denorm")
 
     def delete_assignment(self, assignment_id: int) -> None:
-        with self._connect() as conn:
-            conn.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
+        with self._conn:
+            self._conn.execute(_SQL_DELETE_ASSIGNMENT, (assignment_id,))
+        self._invalidate("list_assignments", "list_assignments_denorm")
 
     def bulk_positions(self, scenario_id: int) -> Iterable[tuple[int, str]]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT id, title FROM positions WHERE scenario_id = ? ORDER BY title",
-                (scenario_id,),
-            ).fetchall()
-        return [(row["id"], row["title"]) for row in rows]
+        return self._conn.execute(_SQL_BULK_POSITIONS, (scenario_id,)).fetchall()
 
     def bulk_employees(self) -> Iterable[tuple[int, str]]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT id, full_name FROM employees ORDER BY full_name"
-            ).fetchall()
-        return [(row["id"], row["full_name"]) for row in rows]
+        return self._conn.execute(_SQL_BULK_EMPLOYEES).fetchall()